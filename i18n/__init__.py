@@ -0,0 +1 @@
+# Interface translations, one module per language code (see LANGUAGES in main.py).
@@ -0,0 +1,58 @@
+# Azerbaijani interface texts. Loaded lazily by load_translations() in main.py.
+
+TRANSLATIONS = {
+    "start_greeting": "<b>🔥Salam!🔥</b>\n\n- Giriş üçün /subscribe.\n- Sınaq girişi üçün /trial.\n- Profil üçün /profile.\n- Kömək üçün /help.\n- Dili dəyişmək üçün /language.",
+    "access_active": "✅ Giriş aktivdir! Sualınızı göndərin.",
+    "trial_active": "🕒 Sınaq girişi aktivdir. Sualınızı göndərin.",
+    "no_access": "🔒 Giriş yoxdur. /subscribe və ya /trial",
+    "admin_only": "⛔ Yalnız administrator üçün.",
+    "no_subscribers": "📭 Aktiv abunəçi yoxdur.",
+    "subscription_active": "✅ Abunəlik artıq aktivdir!\n\nLayihəni dəstəkləyə bilərsiniz ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
+    "subscription_info": "Abunəlik 1.9₼ 25 gün üçün.\nKartla ödəyin:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Qəbzi şəkil kimi göndərin.",
+    "trial_activated": "🎉 Sınaq müddəti {} dəqiqə üçün aktivləşdirildi!",
+    "trial_cooldown": "⏳ Sınaq girişi 5 gündə bir dəfə alına bilər.\nGözləmə vaxtı: {} dəqiqə.",
+    "generating_image": "🖼 Şəkil yaradılır, gözləyin...",
+    "reading_pdf": "📄 PDF oxunur...",
+    "language_selected": "🌍 Azərbaycan dili seçildi",
+    "deletion": "❌ Abunəliyiniz administrator tərəfindən deaktiv edilib.",
+    "processing": "✍ Uzun mətn emal olunur, bir az gözləyin...",
+    "analyzing_link": "🔍 Link təhlil edilir...",
+    "only1": "🚫 Sınaq müddətində yalnız bir dəfə şəkil yarada bilərsiniz.",
+    "txt": "📄 Faylı oxuyuram və suallara cavab verirəm...",
+    "pdf_error": "❌ PDF-dən mətni oxumaq mümkün deyil. Bunun skan olmadığına əmin olun.",
+    "this_is_task": "📝 Bu bir tapşırığdır",
+    "this_is_receipt": "🧾 Bu bir çekdir",
+    "choose_image_type": "Şəkil növünü seçin:",
+    "photo_not_found": "❌ Şəkil tapılmadı. Zəhmət olmasa yenidən göndərin.",
+    "receipt_received": "✅ Qəbz alındı. Təsdiqi gözləyin.",
+    "receipt_already_sent": "⚠ Artıq qəbz göndərmisiniz. Təsdiqi gözləyin.",
+    "trial_given": "🎉 Sizə {minutes} dəqiqə sınaq girişi verildi!",
+    "no_keys": "❌ Şəkil yaratmaq üçün açarlarınız qurtardı. Yeni abunəliyi gözləyin.",
+    "profile_active": "👤 Profiliniz:\n\n📅 Abunəlik aktivdir. Qalan: {days} gün\n🔑 Şəkil yaratmaq açarları: {keys}",
+    "profile_inactive": "👤 Profiliniz:\n\n❌ Abunəlik aktiv deyil.\n🔑 Mövcud açarlar (dondurulub): {keys}\n\nAçarları istifadə etmək üçün abunə olun.",
+    "trial_status": "🕒 Sınaq dövrü aktivdir. Qalan: {seconds} san.",
+    "subscription_activated": "✅ Abunəlik {days} günlük aktivləşdirildi!",
+    "select_language": "🌍 Dil seçin:",
+    "help_text": """
+<b>    🛠 Mövcud əmrlər:</b>
+/start — Bot ilə işə başlayın
+/subscribe — Abunəlik ödəniş təlimatları
+/status — Abunəlik statusunu yoxlayın
+/trial - Sınaq girişi əldə edin
+/language — İnterfeys dilini dəyişin
+/help — Bütün əmrlərin siyahısını göstərin
+
+<b>📌 Botdan necə istifadə etmək olar:</b>
+— Mətn sualı göndərin 📝 - cavab alın 
+— Link göndərin 🔗 - bot təhlil edib testi həll edəcək
+— Tapşırığın şəklini göndərin 📷 - bot tanıyıb həll edəcək
+— Şəkil təsvirini göndərin 🌅 - yaradılmış şəkil alın  
+
+ℹ Şəkil yaratmaq üçün bu açar sözləri istifadə edin: <i>generate &lt;sizin təsviriniz&gt;</i>  
+
+<b>    🔒 Abunəlik:</b>
+Bot abunəlik olmadan işləmir. Giriş üçün /subscribe istifadə edin.
+
+🆘 <b><a href="https://t.me/aarzmnl">Dəstək</a></b>
+"""
+}
@@ -0,0 +1,58 @@
+# English interface texts. Loaded lazily by load_translations() in main.py.
+
+TRANSLATIONS = {
+    "start_greeting": "<b>🔥Hello!🔥</b>\n\n- Write /subscribe for access.\n- /trial for trial access.\n- /profile to check the profile.\n- /help for help.\n- /language to change language.",
+    "access_active": "✅ Access is active! Send your question.",
+    "trial_active": "🕒 Trial access is active. Send your question.",
+    "no_access": "🔒 No access. Write /subscribe or /trial.",
+    "admin_only": "⛔ Admin only.",
+    "no_subscribers": "📭 No active subscribers.",
+    "subscription_active": "✅ Subscription is already active!\n\nYou can support the project ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
+    "subscription_info": "Subscription 1.9₼ for 25 days.\nPay to card:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Send screenshot of receipt.",
+    "trial_activated": "🎉 Trial period activated for {} minutes!",
+    "trial_cooldown": "⏳ Trial access can be obtained once every 5 days.\nTime left to wait: {} minutes.",
+    "generating_image": "🖼 Generating image, please wait...",
+    "reading_pdf": "📄 Reading PDF...",
+    "language_selected": "🌍 English language selected",
+    "deletion": "❌ Your subscription has been disabled by the administrator.",
+    "processing": "✍ Processing long text, please wait a bit...",
+    "analyzing_link": "🔍 Analyzing the link...",
+    "only1": "🚫 During the trial period, you can generate an image only once.",
+    "txt": "📄 Reading the file and answering the questions...",
+    "pdf_error": "❌ Unable to read text from PDF. Make sure it is not a scan.",
+    "this_is_task": "📝 This is a task",
+    "this_is_receipt": "🧾 This is a receipt",
+    "choose_image_type": "Choose image type:",
+    "photo_not_found": "❌ Photo not found. Please resend.",
+    "receipt_received": "✅ Receipt received. Wait for approval.",
+    "receipt_already_sent": "⚠ You have already sent a receipt. Wait for approval.",
+    "trial_given": "🎉 You have been given trial access for {minutes} minutes!",
+    "trial_status": "🕒 Trial period is active. Time left: {seconds} sec.",
+    "no_keys": "❌ You have run out of image generation keys. Please wait for a new subscription.",
+    "profile_active": "👤 Your profile:\n\n📅 Subscription active. Remaining: {days} days\n🔑 Image generation keys: {keys}",
+    "profile_inactive": "👤 Your profile:\n\n❌ Subscription not active.\n🔑 Available keys (frozen): {keys}\n\nSubscribe to use keys.",
+    "subscription_activated": "✅ Subscription activated for {days} days!",
+    "select_language": "🌍 Choose language:",
+    "help_text": """
+<b>    🛠 Available commands:</b>
+/start — Start working with the bot
+/subscribe — Payment subscription instructions
+/status — Check subscription status
+/trial - Get trial access
+/language — Change interface language
+/help — Show list of all commands
+
+<b>📌 How to use the bot:</b>
+— Send text question 📝 - get answer 
+— Send link 🔗 - bot will analyze and solve test
+— Send photo of task or screenshot 📷 - bot will recognize and solve
+— Send image description 🌅 - get generated image  
+
+ℹ To generate image, use keywords like: <i>generate &lt;your description&gt;</i>  
+
+<b>    🔒 Subscription:</b>
+Bot doesn't work without subscription. Use /subscribe to get access.
+
+🆘 <b><a href="https://t.me/aarzmnl">Support</a></b>
+"""
+}
@@ -0,0 +1,58 @@
+# Russian interface texts. Loaded lazily by load_translations() in main.py.
+
+TRANSLATIONS = {
+    "start_greeting": "<b>🔥Привет!🔥</b>\n\n- Напиши /subscribe для доступа.\n- /trial для пробного доступа.\n- /profile для просмотра профиля.\n- /help для помощи.\n- /language для смены языка.",
+    "access_active": "✅ Доступ активен! Отправьте вопрос.",
+    "trial_active": "🕒 Пробный доступ активен. Отправьте вопрос.",
+    "no_access": "🔒 Нет доступа. Напиши /subscribe или /trial.",
+    "admin_only": "⛔ Только для администратора.",
+    "no_subscribers": "📭 Нет активных подписчиков.",
+    "subscription_active": "✅ Подписка уже активна!\n\nМожешь поддержать проект ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
+    "subscription_info": "Подписка 1.9₼ на 25 дней.\nОплати на карту:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Отправь скрин чека.",
+    "trial_activated": "🎉 Пробный период активирован на {} минут!",
+    "trial_cooldown": "⏳ Пробный доступ можно получить раз в 5 дней.\nОсталось подождать: {} минут.",
+    "generating_image": "🖼 Генерирую изображение, подождите...",
+    "reading_pdf": "📄 Читаю PDF...",
+    "language_selected": "🌍 Выбран русский язык",
+    "deletion": "❌ Ваша подписка была отключена администратором.",
+    "processing": "✍ Обрабатываю длинный текст, подождите немного...",
+    "analyzing_link": "🔍 Анализирую ссылку...",
+    "only1": "🚫 Во время пробного периода можно сгенерировать изображение только 1 раз.",
+    "txt": "📄 Читаю файл и отвечаю на вопросы...",
+    "pdf_error": "❌ Не удалось прочитать текст из PDF. Убедись, что это не скан.",
+    "this_is_task": "📝 Это задание",
+    "this_is_receipt": "🧾 Это чек",
+    "choose_image_type": "Выберите тип изображения:",
+    "photo_not_found": "❌ Фото не найдено. Пожалуйста, отправьте заново.",
+    "receipt_received": "✅ Чек получен. Ожидайте одобрения.",
+    "receipt_already_sent": "⚠ Вы уже отправляли чек. Ожидайте одобрения.",
+    "trial_given": "🎉 Вам выдан пробный доступ на {minutes} минут!",
+    "trial_status": "🕒 Пробный период активен. Осталось: {seconds} сек.",
+    "profile_active": "👤 Ваш профиль:\n\n📅 Подписка активна. Осталось: {days} дн.\n🔑 Ключи для генерации: {keys}",
+    "profile_inactive": "👤 Ваш профиль:\n\n❌ Подписка не активна.\n🔑 Доступные ключи (заморожены): {keys}\n\nЧтобы использовать ключи — оформите подписку.",
+    "subscription_activated": "✅ Подписка активирована на {days} дней!",
+    "no_keys": "❌ У вас закончились ключи для генерации изображения. Дождитесь новой подписки.",
+    "select_language": "🌍 Выберите язык:",
+    "help_text": """
+<b>    🛠 Доступные команды:</b>
+/start — Начать работу с ботом
+/subscribe — Инструкция по оплате подписки
+/status — Узнать статус подписки
+/trial - Получить пробный доступ
+/language — Сменить язык интерфейса
+/help — Показать список всех команд
+
+<b>📌 Как пользоваться ботом:</b>
+— Отправь вопрос текстом 📝 - получишь ответ 
+— Отправь ссылку 🔗 - бот проанализирует и решит тест
+— Отправь фото задания или скриншот 📷 - бот распознает и решит
+— Отправь описание изображения 🌅 - получишь сгенерированное изображение  
+
+ℹ Чтобы сгенерировать изображение, используй ключевые слова как: <i>сгенерируй &lt;твоё описание&gt;</i> или <i>generate &lt;your description&gt;</i>  
+
+<b>    🔒 Подписка:</b>
+Без подписки бот не работает. Используй /subscribe чтобы получить доступ.
+
+🆘 <b><a href="https://t.me/aarzmnl">Поддержка</a></b>
+"""
+}
@@ -1,23 +1,49 @@
 import os
-import io
+import sys
 import re
 import json
 import time
 import pickle
-import random
+import pickletools
+import hashlib
+import atexit
+import signal
+import tempfile
+import importlib
+import functools
+import itertools
 from io import BytesIO
-from threading import Thread
-from collections import defaultdict
+from threading import Thread, Lock, RLock
+from queue import SimpleQueue, Empty
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import requests
-from flask import Flask
+from requests.adapters import HTTPAdapter
 
 import telebot
 from telebot import types
 
-from bs4 import BeautifulSoup
 from PIL import Image
-from PyPDF2 import PdfReader
+
+from cachetools import TTLCache
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+    from lxml import etree, html as lxml_html
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None  # pypdfium2 is imported on first use instead, so the bot starts without either
 
 import google.generativeai as genai
 import replicate
@@ -25,10 +51,13 @@ import replicate
 
 # -------------------- Config --------------------
 
+DAY_SECONDS = 24 * 60 * 60
+
 SUBSCRIPTION_DAYS = 25
+SUBSCRIPTION_SECONDS = SUBSCRIPTION_DAYS * DAY_SECONDS
 
 TRIAL_PERIOD_SECONDS = 600          # 10 minutes
-TRIAL_COOLDOWN_SECONDS = 5 * 24 * 60 * 60  # 5 days
+TRIAL_COOLDOWN_SECONDS = 5 * DAY_SECONDS  # 5 days
 
 PORT = int(os.environ.get("PORT", "8080"))
 SELF_PING_URL = os.environ.get("SELF_PING_URL")  
@@ -56,33 +85,96 @@ if not REPLICATE_API_KEYS:
 
 # -------------------- Storage files --------------------
 
-SUBSCRIBERS_FILE = "subscribers.json"       # { "user_id": expires_ts }
-PENDING_REQUESTS_FILE = "requests.pkl"      # set(str_user_id)
-CHECK_PHOTOS_FILE = "check_photos.pkl"      # { str_user_id: bytes }
-IMAGE_KEYS_FILE = "image_keys.pkl"          # { str_user_id: { "keys": int } }
+SUBSCRIBERS_FILE = "subscribers.json"       # { "user_id": expires_ts }, int keys in memory
+PENDING_REQUESTS_FILE = "requests.pkl"      # set(int_user_id)
+CHECK_PHOTOS_FILE = "check_photos.pkl"      # legacy { str_user_id: bytes }, migrated to RECEIPTS_DIR
+RECEIPTS_DIR = "receipts"                   # legacy one <user_id>.jpg per pending receipt
+RECEIPTS_FILE = "receipts.json"             # { "user_id": telegram_file_id }, int keys in memory
+IMAGE_KEYS_FILE = "image_keys.pkl"          # { int_user_id: { "keys": int } }
 TRIALS_FILE = "trials.pkl"                  # { int_user_id: {start_time,last_trial_time,used_image} }
-LANG_FILE = "user_languages.pkl"
+LANG_FILE = "user_languages.pkl"           # { int_user_id: lang }
+
+FLUSH_INTERVAL_SECONDS = 0.5  # stores are written to disk at most this often
+IDLE_EXPIRE_SECONDS = 60      # while idle, the writer thread evicts expired caches this often
+
+# Unanswered "task or receipt?" photos. An entry is only a file_id and a
+# caption (well under 1 KB), so the cap sits far above the number of users
+# who could realistically be mid-prompt at once; the TTL does the evicting.
+PENDING_PHOTOS_MAX = 10_000
+PENDING_PHOTO_TTL_SECONDS = 30 * 60
 
+BOT_THREADS = 16   # telebot update dispatch threads
+SEND_INTERVAL_SECONDS = 1 / 30  # Telegram allows ~30 messages per second per bot
+JOB_WORKERS = 32   # shared pool for slow Gemini / Replicate work
 
-# -------------------- Flask keep-alive --------------------
 
-app = Flask(__name__)
+# -------------------- Patterns (compiled once) --------------------
 
-@app.route("/")
-def index():
-    return "alive"
+_URL_RE = re.compile(r"https?://\S+")
+_LEADING_WS_RE = re.compile(r"\s*")
+# any line boundary str.splitlines() knows, plus surrounding blanks and empty lines
+_LINE_BREAK_RE = re.compile(r"[^\S\n\r\v\f\x1c-\x1e\x85\u2028\u2029]*[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]\s*")
 
-def run_flask():
-    app.run(host="0.0.0.0", port=PORT)
+# phrases that turn a text message into an image-generation request
+IMAGE_PHRASES = ["сгенерируй", "generate image", "generate", "нарисуй", "создай изображение", "создай фото", "создай картинку", "draw"]
+# phrases blocked once a trial user has used their single image
+TRIAL_IMAGE_PHRASES = ["сгенерируй", "generate", "draw", "нарисуй"]
+
+# one alternation per list: a single C-level scan instead of a substring search per phrase
+_IMAGE_RE = re.compile("|".join(map(re.escape, IMAGE_PHRASES)), re.IGNORECASE)
+_TRIAL_IMAGE_RE = re.compile("|".join(map(re.escape, TRIAL_IMAGE_PHRASES)), re.IGNORECASE)
+
+def find_url(text: str) -> str | None:
+    # most messages carry no link, so skip the regex unless one is possible
+    if "http" not in text:
+        return None
+    m = _URL_RE.search(text)
+    return m.group() if m else None
 
-Thread(target=run_flask, daemon=True).start()
+
+# -------------------- Shared HTTP session --------------------
+
+# One pooled keep-alive session for the self-ping and every Telegram API call,
+# so requests reuse open TLS connections instead of handshaking each time.
+http_session = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=2)
+http_session.mount("https://", _http_adapter)
+http_session.mount("http://", _http_adapter)
+
+telebot.apihelper.session = http_session
+telebot.apihelper.CONNECT_TIMEOUT = 10
+
+
+# -------------------- Keep-alive HTTP server --------------------
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", "5")
+        self.end_headers()
+        self.wfile.write(b"alive")
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", "5")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # health checks would otherwise flood stderr
+
+def run_keep_alive_server():
+    ThreadingHTTPServer(("0.0.0.0", PORT), KeepAliveHandler).serve_forever()
+
+Thread(target=run_keep_alive_server, daemon=True).start()
 
 def ping_self():
     if not SELF_PING_URL:
         return
     while True:
         try:
-            requests.get(SELF_PING_URL, timeout=10)
+            http_session.get(SELF_PING_URL, timeout=10)
         except Exception:
             pass
         time.sleep(300)
@@ -92,13 +184,52 @@ Thread(target=ping_self, daemon=True).start()
 
 # -------------------- Bot + Gemini init --------------------
 
-bot = telebot.TeleBot(BOT_TOKEN)
+bot = telebot.TeleBot(BOT_TOKEN, num_threads=BOT_THREADS)
 
 current_key_index = 0
 genai.configure(api_key=GEMINI_API_KEYS[current_key_index]) #5 keys
 model = genai.GenerativeModel("gemini-2.5-flash")
 
 
+# -------------------- Background jobs (per-chat ordering) --------------------
+
+# Slow work from different chats runs concurrently on one shared pool, while
+# jobs from the same chat still run one after another in arrival order.
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+_chat_queues = defaultdict(deque)   # chat_id -> pending (fn, args); present while busy
+_chat_lock = Lock()
+
+def submit_for_chat(chat_id: int, fn, *args) -> None:
+    with _chat_lock:
+        busy = chat_id in _chat_queues
+        _chat_queues[chat_id].append((fn, args))
+    if not busy:
+        _job_pool.submit(_run_next_for_chat, chat_id)
+
+def _run_next_for_chat(chat_id: int) -> None:
+    with _chat_lock:
+        fn, args = _chat_queues[chat_id][0]
+    try:
+        fn(*args)
+    except Exception:
+        telebot.logger.exception("Background job failed for chat %s", chat_id)
+    finally:
+        with _chat_lock:
+            queue = _chat_queues[chat_id]
+            queue.popleft()
+            if not queue:
+                del _chat_queues[chat_id]
+        if queue:
+            _job_pool.submit(_run_next_for_chat, chat_id)
+
+def in_chat_queue(handler):
+    """Run a message handler as a per-chat background job instead of on the dispatcher thread."""
+    @functools.wraps(handler)
+    def wrapper(message):
+        submit_for_chat(message.chat.id, handler, message)
+    return wrapper
+
+
 # -------------------- Helpers: persistence --------------------
 
 def safe_load_pickle(file_path: str, default_value):
@@ -110,44 +241,211 @@ def safe_load_pickle(file_path: str, default_value):
             return default_value
     return default_value
 
+_saved_digests = {}  # file_path -> digest of the last payload written
+
+# mkstemp creates files as 0600; new stores get the mode open() would have given them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_NEW_FILE_MODE = 0o666 & ~_UMASK
+
+def _write_atomic(file_path: str, data: bytes) -> None:
+    # skip the write entirely when nothing changed since the last save
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if _saved_digests.get(file_path) == digest:
+        return
+
+    try:
+        mode = os.stat(file_path).st_mode & 0o7777
+    except OSError:
+        mode = _NEW_FILE_MODE
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            # the data must be on disk before the rename, or a crash can leave an empty store
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _saved_digests[file_path] = digest
+
 def safe_save_pickle(file_path: str, obj) -> None:
-    with open(file_path, "wb") as f:
-        pickle.dump(obj, f)
+    # optimize() drops unused PUT opcodes: smaller files and faster loads
+    _write_atomic(file_path, pickletools.optimize(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
 
 def load_json(file_path: str, default_value):
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(file_path, "rb") as f:
+                data = f.read()
+            return orjson.loads(data) if orjson is not None else json.loads(data)
         except Exception:
             return default_value
     return default_value
 
 def save_json(file_path: str, obj) -> None:
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    # orjson writes UTF-8 bytes directly; NON_STR_KEYS turns int user ids into string keys like json does
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    _write_atomic(file_path, data)
+
+
+# -------------------- Background flushing --------------------
+
+_dirty = SimpleQueue()    # names of stores changed since the last flush, one put per change
+_writers = {}             # store name -> save function
+_flush_lock = Lock()      # one flush at a time, so writes to a file stay in order
+
+def _mark_dirty(name: str) -> None:
+    # a lock-free put: handlers never wait on disk I/O or on the writer thread
+    _dirty.put(name)
+
+def _write_stores(names: set) -> None:
+    with _flush_lock:
+        while True:
+            try:
+                names.add(_dirty.get_nowait())
+            except Empty:
+                break
+        for name in names:
+            try:
+                _writers[name]()
+            except Exception:
+                telebot.logger.exception("Saving %s failed, will retry", name)
+                _mark_dirty(name)
+
+def flush_dirty() -> None:
+    # The writer thread may be holding names it already took off the queue,
+    # so write every store; ones whose content didn't change are skipped.
+    _write_stores(set(_writers))
+
+def _flush_loop():
+    while True:
+        try:
+            names = {_dirty.get(timeout=IDLE_EXPIRE_SECONDS)}
+        except Empty:
+            # TTLCache only evicts on access, so clear out stale entries while idle
+            expire_pending_photos()
+            continue
+        # coalesce every change made during the window into one write per store
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        _write_stores(names)
+
+atexit.register(flush_dirty)
+# turn SIGTERM (sent by the host on redeploy) into a normal exit so atexit runs
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
 
 # -------------------- Subscribers / requests / checks --------------------
 
-subscribers = load_json(SUBSCRIBERS_FILE, {})  
+# User ids are Telegram ints everywhere in memory (JSON stores them as string
+# keys); expiry timestamps are coerced to float once here, never on each check.
+subscribers = {int(uid): float(exp) for uid, exp in load_json(SUBSCRIBERS_FILE, {}).items()}
 
-pending_requests = safe_load_pickle(PENDING_REQUESTS_FILE, set())  
-pending_check_photos = safe_load_pickle(CHECK_PHOTOS_FILE, {})     
+pending_requests = set(map(int, safe_load_pickle(PENDING_REQUESTS_FILE, set())))
 
-image_keys = safe_load_pickle(IMAGE_KEYS_FILE, {})  
+image_keys = {int(uid): rec for uid, rec in safe_load_pickle(IMAGE_KEYS_FILE, {}).items()}
+
+# One lock per store. Single lookups stay lock-free (they are atomic under the
+# GIL); the locks serialize read-modify-write sequences and the snapshots the
+# background writer takes, so a save never sees a store mid-update.
+_subscribers_lock = RLock()
+_requests_lock = RLock()
+_image_keys_lock = RLock()
 
 def save_subscribers():
-    save_json(SUBSCRIBERS_FILE, subscribers)
+    with _subscribers_lock:
+        snapshot = dict(subscribers)
+    save_json(SUBSCRIBERS_FILE, snapshot)
+
+_writers["subscribers"] = save_subscribers
 
 def save_pending_requests():
-    safe_save_pickle(PENDING_REQUESTS_FILE, pending_requests)
+    with _requests_lock:
+        snapshot = set(pending_requests)
+    safe_save_pickle(PENDING_REQUESTS_FILE, snapshot)
 
-def save_pending_check_photos():
-    safe_save_pickle(CHECK_PHOTOS_FILE, pending_check_photos)
+_writers["requests"] = save_pending_requests
 
 def save_image_keys():
-    safe_save_pickle(IMAGE_KEYS_FILE, image_keys)
+    with _image_keys_lock:
+        snapshot = {uid: dict(rec) for uid, rec in image_keys.items()}
+    safe_save_pickle(IMAGE_KEYS_FILE, snapshot)
+
+_writers["image_keys"] = save_image_keys
+
+def grant_image_keys(user_id: int, keys: int = 10) -> None:
+    with _image_keys_lock:
+        image_keys[user_id] = {"keys": keys}
+    _mark_dirty("image_keys")
+
+def take_image_key(user_id: int) -> bool:
+    """Spend one image-generation key; False if the user has none left."""
+    with _image_keys_lock:
+        rec = image_keys.get(user_id)
+        if not rec or int(rec.get("keys", 0)) <= 0:
+            return False
+        rec["keys"] = int(rec["keys"]) - 1
+    _mark_dirty("image_keys")
+    return True
+
+
+# -------------------- Receipt photos (Telegram file_id per user) --------------------
+
+# Receipts stay on Telegram's servers: the bot only remembers the photo's
+# file_id and re-sends it from there, so nothing is downloaded or stored.
+receipt_file_ids = {int(uid): file_id for uid, file_id in load_json(RECEIPTS_FILE, {}).items()}
+
+def save_receipts():
+    with _requests_lock:
+        snapshot = dict(receipt_file_ids)
+    save_json(RECEIPTS_FILE, snapshot)
+
+_writers["receipts"] = save_receipts
+
+def save_receipt_photo(uid: int, file_id: str) -> None:
+    with _requests_lock:
+        receipt_file_ids[uid] = file_id
+    _mark_dirty("receipts")
+
+def remove_receipt_photo(uid: int) -> None:
+    with _requests_lock:
+        removed = receipt_file_ids.pop(uid, None) is not None
+    if removed:
+        _mark_dirty("receipts")
+
+    # receipts saved by older versions still live on disk
+    if uid in pending_check_photos:
+        pending_check_photos.discard(uid)
+        try:
+            os.remove(receipt_photo_path(uid))
+        except OSError:
+            pass
+
+def receipt_photo_path(uid: int) -> str:
+    return os.path.join(RECEIPTS_DIR, f"{uid}.jpg")
+
+os.makedirs(RECEIPTS_DIR, exist_ok=True)
+
+# one-shot migration from the old all-in-one pickle
+if os.path.exists(CHECK_PHOTOS_FILE):
+    for _uid, _data in safe_load_pickle(CHECK_PHOTOS_FILE, {}).items():
+        _write_atomic(receipt_photo_path(_uid), _data)
+    os.remove(CHECK_PHOTOS_FILE)
+
+# only <user_id>.jpg names count; stray files in the folder are ignored
+pending_check_photos = {
+    int(name[:-4]) for name in os.listdir(RECEIPTS_DIR) if name.endswith(".jpg") and name[:-4].isdigit()
+}
 
 
 # -------------------- Trial (no database) --------------------
@@ -160,22 +458,30 @@ try:
 except Exception:
     trials = {}
 
+_trials_lock = RLock()
+
 def save_trials():
-    safe_save_pickle(TRIALS_FILE, trials)
+    with _trials_lock:
+        snapshot = {uid: dict(rec) for uid, rec in trials.items()}
+    safe_save_pickle(TRIALS_FILE, snapshot)
+
+_writers["trials"] = save_trials
 
 def _get_trial_record(user_id: int):
-    return trials.get(int(user_id))
+    return trials.get(user_id)
 
 def _upsert_trial_record(user_id: int, record: dict):
-    trials[int(user_id)] = record
-    save_trials()
+    with _trials_lock:
+        trials[user_id] = record
+    _mark_dirty("trials")
 
 def _set_trial_used_image(user_id: int, used: int):
-    rec = _get_trial_record(user_id) or {}
-    rec["used_image"] = int(used)
-    rec.setdefault("start_time", None)
-    rec.setdefault("last_trial_time", None)
-    _upsert_trial_record(user_id, rec)
+    with _trials_lock:
+        rec = _get_trial_record(user_id) or {}
+        rec["used_image"] = int(used)
+        rec.setdefault("start_time", None)
+        rec.setdefault("last_trial_time", None)
+        _upsert_trial_record(user_id, rec)
 
 def start_trial(user_id: int):
     now = time.time()
@@ -191,15 +497,24 @@ def get_trial_info(user_id: int):
         return rec.get("start_time"), rec.get("last_trial_time")
     return None, None
 
-def is_trial_active(user_id: int) -> bool:
+# Access checks take an optional `now` so a handler can read the clock once
+# and get consistent answers from every check it makes.
+
+def is_trial_active(user_id: int, now: float | None = None) -> bool:
     start_time, _ = get_trial_info(user_id)
-    return bool(start_time and (time.time() - start_time) < TRIAL_PERIOD_SECONDS)
+    if not start_time:
+        return False
+    if now is None:
+        now = time.time()
+    return (now - start_time) < TRIAL_PERIOD_SECONDS
 
-def can_start_trial(user_id: int) -> bool:
+def can_start_trial(user_id: int, now: float | None = None) -> bool:
     _, last_trial_time = get_trial_info(user_id)
     if not last_trial_time:
         return True
-    return (time.time() - last_trial_time) >= TRIAL_COOLDOWN_SECONDS
+    if now is None:
+        now = time.time()
+    return (now - last_trial_time) >= TRIAL_COOLDOWN_SECONDS
 
 def get_trial_time(user_id: int):
     rec = _get_trial_record(user_id)
@@ -210,280 +525,197 @@ def get_trial_time(user_id: int):
 
 # -------------------- Access checks --------------------
 
-def is_subscribed(user_id) -> bool:
-    uid = str(user_id)
-    return uid in subscribers and float(subscribers[uid]) > time.time()
+def is_subscribed(user_id, now: float | None = None) -> bool:
+    expires = subscribers.get(user_id)
+    if expires is None:
+        return False
+    return expires > (time.time() if now is None else now)
 
-def has_active_subscription(user_id) -> bool:
-    return is_subscribed(user_id)
+def has_active_subscription(user_id, now: float | None = None) -> bool:
+    return is_subscribed(user_id, now)
 
 
 # -------------------- Languages --------------------
 
-TRANSLATIONS = {
-    "ru": {
-        "start_greeting": "<b>🔥Привет!🔥</b>\n\n- Напиши /subscribe для доступа.\n- /trial для пробного доступа.\n- /profile для просмотра профиля.\n- /help для помощи.\n- /language для смены языка.",
-        "access_active": "✅ Доступ активен! Отправьте вопрос.",
-        "trial_active": "🕒 Пробный доступ активен. Отправьте вопрос.",
-        "no_access": "🔒 Нет доступа. Напиши /subscribe или /trial.",
-        "admin_only": "⛔ Только для администратора.",
-        "no_subscribers": "📭 Нет активных подписчиков.",
-        "subscription_active": "✅ Подписка уже активна!\n\nМожешь поддержать проект ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
-        "subscription_info": "Подписка 1.9₼ на 25 дней.\nОплати на карту:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Отправь скрин чека.",
-        "trial_activated": "🎉 Пробный период активирован на {} минут!",
-        "trial_cooldown": "⏳ Пробный доступ можно получить раз в 5 дней.\nОсталось подождать: {} минут.",
-        "generating_image": "🖼 Генерирую изображение, подождите...",
-        "reading_pdf": "📄 Читаю PDF...",
-        "language_selected": "🌍 Выбран русский язык",
-        "deletion": "❌ Ваша подписка была отключена администратором.",
-        "processing": "✍ Обрабатываю длинный текст, подождите немного...",
-        "analyzing_link": "🔍 Анализирую ссылку...",
-        "only1": "🚫 Во время пробного периода можно сгенерировать изображение только 1 раз.",
-        "txt": "📄 Читаю файл и отвечаю на вопросы...",
-        "pdf_error": "❌ Не удалось прочитать текст из PDF. Убедись, что это не скан.",
-        "this_is_task": "📝 Это задание",
-        "this_is_receipt": "🧾 Это чек",
-        "choose_image_type": "Выберите тип изображения:",
-        "photo_not_found": "❌ Фото не найдено. Пожалуйста, отправьте заново.",
-        "receipt_received": "✅ Чек получен. Ожидайте одобрения.",
-        "receipt_already_sent": "⚠ Вы уже отправляли чек. Ожидайте одобрения.",
-        "trial_given": "🎉 Вам выдан пробный доступ на {minutes} минут!",
-        "trial_status": "🕒 Пробный период активен. Осталось: {seconds} сек.",
-        "profile_active": "👤 Ваш профиль:\n\n📅 Подписка активна. Осталось: {days} дн.\n🔑 Ключи для генерации: {keys}",
-        "profile_inactive": "👤 Ваш профиль:\n\n❌ Подписка не активна.\n🔑 Доступные ключи (заморожены): {keys}\n\nЧтобы использовать ключи — оформите подписку.",
-        "subscription_activated": "✅ Подписка активирована на {days} дней!",
-        "no_keys": "❌ У вас закончились ключи для генерации изображения. Дождитесь новой подписки.",
-        "select_language": "🌍 Выберите язык:",
-        "help_text": """
-<b>    🛠 Доступные команды:</b>
-/start — Начать работу с ботом
-/subscribe — Инструкция по оплате подписки
-/status — Узнать статус подписки
-/trial - Получить пробный доступ
-/language — Сменить язык интерфейса
-/help — Показать список всех команд
-
-<b>📌 Как пользоваться ботом:</b>
-— Отправь вопрос текстом 📝 - получишь ответ 
-— Отправь ссылку 🔗 - бот проанализирует и решит тест
-— Отправь фото задания или скриншот 📷 - бот распознает и решит
-— Отправь описание изображения 🌅 - получишь сгенерированное изображение  
-
-ℹ Чтобы сгенерировать изображение, используй ключевые слова как: <i>сгенерируй &lt;твоё описание&gt;</i> или <i>generate &lt;your description&gt;</i>  
-
-<b>    🔒 Подписка:</b>
-Без подписки бот не работает. Используй /subscribe чтобы получить доступ.
-
-🆘 <b><a href="https://t.me/aarzmnl">Поддержка</a></b>
-"""
-    },
-    "en": {
-        "start_greeting": "<b>🔥Hello!🔥</b>\n\n- Write /subscribe for access.\n- /trial for trial access.\n- /profile to check the profile.\n- /help for help.\n- /language to change language.",
-        "access_active": "✅ Access is active! Send your question.",
-        "trial_active": "🕒 Trial access is active. Send your question.",
-        "no_access": "🔒 No access. Write /subscribe or /trial.",
-        "admin_only": "⛔ Admin only.",
-        "no_subscribers": "📭 No active subscribers.",
-        "subscription_active": "✅ Subscription is already active!\n\nYou can support the project ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
-        "subscription_info": "Subscription 1.9₼ for 25 days.\nPay to card:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Send screenshot of receipt.",
-        "trial_activated": "🎉 Trial period activated for {} minutes!",
-        "trial_cooldown": "⏳ Trial access can be obtained once every 5 days.\nTime left to wait: {} minutes.",
-        "generating_image": "🖼 Generating image, please wait...",
-        "reading_pdf": "📄 Reading PDF...",
-        "language_selected": "🌍 English language selected",
-        "deletion": "❌ Your subscription has been disabled by the administrator.",
-        "processing": "✍ Processing long text, please wait a bit...",
-        "analyzing_link": "🔍 Analyzing the link...",
-        "only1": "🚫 During the trial period, you can generate an image only once.",
-        "txt": "📄 Reading the file and answering the questions...",
-        "pdf_error": "❌ Unable to read text from PDF. Make sure it is not a scan.",
-        "this_is_task": "📝 This is a task",
-        "this_is_receipt": "🧾 This is a receipt",
-        "choose_image_type": "Choose image type:",
-        "photo_not_found": "❌ Photo not found. Please resend.",
-        "receipt_received": "✅ Receipt received. Wait for approval.",
-        "receipt_already_sent": "⚠ You have already sent a receipt. Wait for approval.",
-        "trial_given": "🎉 You have been given trial access for {minutes} minutes!",
-        "trial_status": "🕒 Trial period is active. Time left: {seconds} sec.",
-        "no_keys": "❌ You have run out of image generation keys. Please wait for a new subscription.",
-        "profile_active": "👤 Your profile:\n\n📅 Subscription active. Remaining: {days} days\n🔑 Image generation keys: {keys}",
-        "profile_inactive": "👤 Your profile:\n\n❌ Subscription not active.\n🔑 Available keys (frozen): {keys}\n\nSubscribe to use keys.",
-        "subscription_activated": "✅ Subscription activated for {days} days!",
-        "select_language": "🌍 Choose language:",
-        "help_text": """
-<b>    🛠 Available commands:</b>
-/start — Start working with the bot
-/subscribe — Payment subscription instructions
-/status — Check subscription status
-/trial - Get trial access
-/language — Change interface language
-/help — Show list of all commands
-
-<b>📌 How to use the bot:</b>
-— Send text question 📝 - get answer 
-— Send link 🔗 - bot will analyze and solve test
-— Send photo of task or screenshot 📷 - bot will recognize and solve
-— Send image description 🌅 - get generated image  
-
-ℹ To generate image, use keywords like: <i>generate &lt;your description&gt;</i>  
-
-<b>    🔒 Subscription:</b>
-Bot doesn't work without subscription. Use /subscribe to get access.
-
-🆘 <b><a href="https://t.me/aarzmnl">Support</a></b>
-"""
-    },
-    "az": {
-        "start_greeting": "<b>🔥Salam!🔥</b>\n\n- Giriş üçün /subscribe.\n- Sınaq girişi üçün /trial.\n- Profil üçün /profile.\n- Kömək üçün /help.\n- Dili dəyişmək üçün /language.",
-        "access_active": "✅ Giriş aktivdir! Sualınızı göndərin.",
-        "trial_active": "🕒 Sınaq girişi aktivdir. Sualınızı göndərin.",
-        "no_access": "🔒 Giriş yoxdur. /subscribe və ya /trial",
-        "admin_only": "⛔ Yalnız administrator üçün.",
-        "no_subscribers": "📭 Aktiv abunəçi yoxdur.",
-        "subscription_active": "✅ Abunəlik artıq aktivdir!\n\nLayihəni dəstəkləyə bilərsiniz ☺:\n💳 4449 9451 0094 0896 (🇦🇿Akart)",
-        "subscription_info": "Abunəlik 1.9₼ 25 gün üçün.\nKartla ödəyin:\n\n💳 4449 9451 0094 0896 (🇦🇿Akart)\n\n📸 Qəbzi şəkil kimi göndərin.",
-        "trial_activated": "🎉 Sınaq müddəti {} dəqiqə üçün aktivləşdirildi!",
-        "trial_cooldown": "⏳ Sınaq girişi 5 gündə bir dəfə alına bilər.\nGözləmə vaxtı: {} dəqiqə.",
-        "generating_image": "🖼 Şəkil yaradılır, gözləyin...",
-        "reading_pdf": "📄 PDF oxunur...",
-        "language_selected": "🌍 Azərbaycan dili seçildi",
-        "deletion": "❌ Abunəliyiniz administrator tərəfindən deaktiv edilib.",
-        "processing": "✍ Uzun mətn emal olunur, bir az gözləyin...",
-        "analyzing_link": "🔍 Link təhlil edilir...",
-        "only1": "🚫 Sınaq müddətində yalnız bir dəfə şəkil yarada bilərsiniz.",
-        "txt": "📄 Faylı oxuyuram və suallara cavab verirəm...",
-        "pdf_error": "❌ PDF-dən mətni oxumaq mümkün deyil. Bunun skan olmadığına əmin olun.",
-        "this_is_task": "📝 Bu bir tapşırığdır",
-        "this_is_receipt": "🧾 Bu bir çekdir",
-        "choose_image_type": "Şəkil növünü seçin:",
-        "photo_not_found": "❌ Şəkil tapılmadı. Zəhmət olmasa yenidən göndərin.",
-        "receipt_received": "✅ Qəbz alındı. Təsdiqi gözləyin.",
-        "receipt_already_sent": "⚠ Artıq qəbz göndərmisiniz. Təsdiqi gözləyin.",
-        "trial_given": "🎉 Sizə {minutes} dəqiqə sınaq girişi verildi!",
-        "no_keys": "❌ Şəkil yaratmaq üçün açarlarınız qurtardı. Yeni abunəliyi gözləyin.",
-        "profile_active": "👤 Profiliniz:\n\n📅 Abunəlik aktivdir. Qalan: {days} gün\n🔑 Şəkil yaratmaq açarları: {keys}",
-        "profile_inactive": "👤 Profiliniz:\n\n❌ Abunəlik aktiv deyil.\n🔑 Mövcud açarlar (dondurulub): {keys}\n\nAçarları istifadə etmək üçün abunə olun.",
-        "trial_status": "🕒 Sınaq dövrü aktivdir. Qalan: {seconds} san.",
-        "subscription_activated": "✅ Abunəlik {days} günlük aktivləşdirildi!",
-        "select_language": "🌍 Dil seçin:",
-        "help_text": """
-<b>    🛠 Mövcud əmrlər:</b>
-/start — Bot ilə işə başlayın
-/subscribe — Abunəlik ödəniş təlimatları
-/status — Abunəlik statusunu yoxlayın
-/trial - Sınaq girişi əldə edin
-/language — İnterfeys dilini dəyişin
-/help — Bütün əmrlərin siyahısını göstərin
-
-<b>📌 Botdan necə istifadə etmək olar:</b>
-— Mətn sualı göndərin 📝 - cavab alın 
-— Link göndərin 🔗 - bot təhlil edib testi həll edəcək
-— Tapşırığın şəklini göndərin 📷 - bot tanıyıb həll edəcək
-— Şəkil təsvirini göndərin 🌅 - yaradılmış şəkil alın  
-
-ℹ Şəkil yaratmaq üçün bu açar sözləri istifadə edin: <i>generate &lt;sizin təsviriniz&gt;</i>  
-
-<b>    🔒 Abunəlik:</b>
-Bot abunəlik olmadan işləmir. Giriş üçün /subscribe istifadə edin.
-
-🆘 <b><a href="https://t.me/aarzmnl">Dəstək</a></b>
-"""
-    },
-}
+# Each language's texts live in i18n/<lang>.py and are imported on first use,
+# so languages nobody picks never take up memory.
+LANGUAGES = ("ru", "en", "az")
+DEFAULT_LANGUAGE = "en"
+
+_translations = {}  # lang -> loaded TRANSLATIONS dict
 
-user_languages = safe_load_pickle(LANG_FILE, {})
+def load_translations(lang: str) -> dict:
+    texts = _translations.get(lang)
+    if texts is None:
+        if lang not in LANGUAGES:
+            lang = DEFAULT_LANGUAGE
+        texts = _translations[lang] = importlib.import_module(f"i18n.{lang}").TRANSLATIONS
+    return texts
+
+user_languages = {int(uid): lang for uid, lang in safe_load_pickle(LANG_FILE, {}).items()}
 
 def save_user_languages():
-    safe_save_pickle(LANG_FILE, user_languages)
+    safe_save_pickle(LANG_FILE, dict(user_languages))
+
+_writers["languages"] = save_user_languages
 
+@functools.lru_cache(maxsize=4096)
 def get_user_language(user_id: int) -> str:
-    return user_languages.get(str(user_id), "en")
+    return user_languages.get(user_id, DEFAULT_LANGUAGE)
+
+@functools.lru_cache(maxsize=4096)
+def _template(lang: str, key: str) -> str:
+    # translations never change at runtime, so (lang, key) results are cached for good
+    return load_translations(lang).get(key) or load_translations(DEFAULT_LANGUAGE).get(key, key)
 
 def get_text(user_id: int, key: str) -> str:
-    lang = get_user_language(user_id)
-    return TRANSLATIONS.get(lang, TRANSLATIONS["en"]).get(key, TRANSLATIONS["en"].get(key, key))
+    return _template(get_user_language(user_id), key)
 
 
 # -------------------- Text splitting --------------------
 
 def split_text(text: str, max_length: int = 4000):
-    parts = []
-    while len(text) > max_length:
-        idx = text.rfind("\n", 0, max_length)
+    # A cursor walks the text and each split point is an rfind inside the
+    # current window, so nothing past the part being yielded is scanned or copied.
+    start = _LEADING_WS_RE.match(text).end()
+    end = len(text)
+    while end > start and text[end - 1].isspace():
+        end -= 1
+
+    while end - start > max_length:
+        idx = text.rfind("\n", start, start + max_length)
         if idx == -1:
-            idx = max_length
-        parts.append(text[:idx].strip())
-        text = text[idx:].strip()
-    if text:
-        parts.append(text)
-    return parts
+            idx = start + max_length
+        part = text[start:idx].strip()
+        if part:
+            yield part
+        start = _LEADING_WS_RE.match(text, idx).end()
+
+    if start < end:
+        yield text[start:end]
 
 
 # -------------------- Gemini helpers --------------------
 
+KEY_COOLDOWN_SECONDS = 60  # a rate-limited key is skipped for this long
+
+_key_cooldown = [0.0] * len(GEMINI_API_KEYS)  # key index -> rate-limited until
+_key_lock = RLock()  # reentrant: safe_generate_content switches keys while holding it
+
 def switch_to_next_key() -> bool:
-    global current_key_index
-    current_key_index += 1
-    if current_key_index >= len(GEMINI_API_KEYS):
-        return False
-    genai.configure(api_key=GEMINI_API_KEYS[current_key_index])
-    return True
+    """Switch to the next key that is not cooling down; False if all of them are."""
+    global current_key_index, model
+    now = time.time()
+    with _key_lock:
+        for step in range(1, len(GEMINI_API_KEYS) + 1):
+            idx = (current_key_index + step) % len(GEMINI_API_KEYS)
+            if _key_cooldown[idx] <= now:
+                if idx != current_key_index:
+                    current_key_index = idx
+                    genai.configure(api_key=GEMINI_API_KEYS[idx])
+                    # the model caches its API client on first use, so rebuild it for the new key
+                    model = genai.GenerativeModel("gemini-2.5-flash")
+                return True
+    return False
 
 def safe_generate_content(prompt_or_parts):
-    global model
-    retries = 0
-    while retries < len(GEMINI_API_KEYS):
+    # The current key stays in use until it hits a 429; later calls go straight
+    # to a healthy key instead of retrying ones that are still cooling down.
+    if _key_cooldown[current_key_index] > time.time() and not switch_to_next_key():
+        raise Exception("All Gemini keys are rate-limited.")
+
+    for _ in range(len(GEMINI_API_KEYS)):
+        with _key_lock:
+            key_index, active_model = current_key_index, model
         try:
-            return model.generate_content(prompt_or_parts)
+            return active_model.generate_content(prompt_or_parts)
         except Exception as e:
             msg = str(e).lower()
-            if "429" in msg or "quota" in msg:
-                if not switch_to_next_key():
-                    raise Exception("All Gemini keys are rate-limited.")
-                model = genai.GenerativeModel("gemini-2.5-flash")
-                retries += 1
-            else:
+            if "429" not in msg and "quota" not in msg:
                 raise
+            with _key_lock:
+                _key_cooldown[key_index] = time.time() + KEY_COOLDOWN_SECONDS
+                # another thread may already have moved off this key; then just retry on the new one
+                if current_key_index == key_index and not switch_to_next_key():
+                    break
+    raise Exception("All Gemini keys are rate-limited.")
 
 
 # -------------------- PDF text extraction --------------------
 
-def extract_text_chunks_from_pdf(pdf_bytes: bytes, pages_per_chunk: int = 5, max_pages: int = 50):
-    try:
-        reader = PdfReader(BytesIO(pdf_bytes))
-        pages = reader.pages[:max_pages]
-        chunks = []
-
-        for i in range(0, len(pages), pages_per_chunk):
-            chunk_pages = pages[i:i + pages_per_chunk]
-            chunk_text = ""
+def _iter_pdf_page_texts(pdf_bytes: bytes, max_pages: int):
+    # Text extraction runs in native code (MuPDF, or PDFium as a fallback);
+    # pages are opened one at a time and the document is closed when done.
+    if fitz is not None:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            for page_index in range(min(doc.page_count, max_pages)):
+                yield doc.load_page(page_index).get_text("text")
+        finally:
+            doc.close()
+    else:
+        import pypdfium2 as pdfium
 
-            for j, page in enumerate(chunk_pages):
+        doc = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for page_index in range(min(len(doc), max_pages)):
+                page = doc[page_index]
+                textpage = page.get_textpage()
                 try:
-                    text = page.extract_text() or ""
-                    chunk_text += f"\n--- Page {i + j + 1} ---\n{text.strip()}"
-                except Exception:
-                    continue
-
-            if len(chunk_text.strip().split()) >= 15:
-                chunks.append(chunk_text.strip())
-
+                    yield textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            doc.close()
+
+def extract_text_chunks_from_pdf(pdf_bytes: bytes, max_chars: int = 8000, max_pages: int = 50):
+    try:
+        chunks = []
+        parts = []
+        size = 0
+        words = 0
+
+        for page_no, text in enumerate(_iter_pdf_page_texts(pdf_bytes, max_pages), start=1):
+            text = (text or "").strip()
+            part = f"\n--- Page {page_no} ---\n{text}"
+
+            # start a new chunk once this page would push it past the budget;
+            # a chunk still too short to stand alone grows into the next one instead
+            if parts and size + len(part) > max_chars and words >= 15:
+                chunks.append("".join(parts).strip())
+                parts = []
+                size = 0
+                words = 0
+
+            parts.append(part)
+            size += len(part)
+            words += len(text.split()) + 4  # "--- Page N ---" itself is 4 words
+
+        if parts:
+            tail = "".join(parts).strip()
+            if words >= 15:
+                chunks.append(tail)
+            elif chunks:
+                chunks[-1] += "\n" + tail  # too short for its own part
         return chunks if chunks else None
     except Exception:
+        # e.g. neither PyMuPDF nor pypdfium2 is installed
+        telebot.logger.exception("PDF text extraction failed")
         return None
 
 
 # -------------------- Replicate image generation --------------------
 
-def set_random_replicate_key():
-    key = random.choice(REPLICATE_API_KEYS)
-    os.environ["REPLICATE_API_TOKEN"] = key
+# one client per key, handed out round-robin to spread load evenly
+_replicate_clients = itertools.cycle([replicate.Client(api_token=key) for key in REPLICATE_API_KEYS])
 
-def generate_image_from_prompt(prompt: str, delay: int = 10):
-    try:
-        set_random_replicate_key()
+def next_replicate_client() -> replicate.Client:
+    return next(_replicate_clients)
 
-        output = replicate.run(
+def generate_image_from_prompt(prompt: str):
+    try:
+        output = next_replicate_client().run(
             "recraft-ai/recraft-v3",
             input={
                 "prompt": prompt,
@@ -495,8 +727,6 @@ def generate_image_from_prompt(prompt: str, delay: int = 10):
             },
         )
 
-        time.sleep(delay)
-
         if hasattr(output, "url"):
             return output.url
         return None
@@ -506,14 +736,29 @@ def generate_image_from_prompt(prompt: str, delay: int = 10):
 
 # -------------------- Photos: task vs receipt --------------------
 
-pending_photos = defaultdict(dict)  
+MAX_IMAGE_SIDE = 1024  # larger photos are downscaled before being sent to Gemini
+
+# photos waiting for the "task or receipt?" answer; unanswered ones expire
+pending_photos = TTLCache(maxsize=PENDING_PHOTOS_MAX, ttl=PENDING_PHOTO_TTL_SECONDS)
+_pending_photos_lock = Lock()
+
+def expire_pending_photos() -> None:
+    with _pending_photos_lock:
+        pending_photos.expire()
 
 def process_image_as_task(user_id: int, file_bytes: bytes, caption: str | None):
     try:
-        image = Image.open(BytesIO(file_bytes)).resize((512, 512))
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_bytes = buffered.getvalue()
+        # Image.open only parses the header; pixels are decoded only if we resize
+        image = Image.open(BytesIO(file_bytes))
+        if max(image.size) > MAX_IMAGE_SIDE:
+            image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.BILINEAR)
+            buffered = BytesIO()
+            image.convert("RGB").save(buffered, format="JPEG", quality=85)
+            img_bytes = buffered.getvalue()
+            mime_type = "image/jpeg"
+        else:
+            img_bytes = file_bytes
+            mime_type = Image.MIME.get(image.format, "image/jpeg")
 
         prompt = caption or "Look at the image and answer in the same language as the task on the photo."
 
@@ -521,7 +766,7 @@ def process_image_as_task(user_id: int, file_bytes: bytes, caption: str | None):
             contents=[
                 {
                     "parts": [
-                        {"inline_data": {"mime_type": "image/png", "data": img_bytes}},
+                        {"inline_data": {"mime_type": mime_type, "data": img_bytes}},
                         {"text": prompt},
                     ]
                 }
@@ -535,56 +780,69 @@ def process_image_as_task(user_id: int, file_bytes: bytes, caption: str | None):
 
 # -------------------- Language commands --------------------
 
+# same for every user, so built once
+_LANG_KEYBOARD = types.InlineKeyboardMarkup()
+_LANG_KEYBOARD.add(
+    types.InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
+    types.InlineKeyboardButton("🇺🇸 English", callback_data="lang_en"),
+)
+_LANG_KEYBOARD.add(types.InlineKeyboardButton("🇦🇿 Azərbaycan", callback_data="lang_az"))
+
 @bot.message_handler(commands=["language"])
 def language_cmd(message):
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(
-        types.InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-        types.InlineKeyboardButton("🇺🇸 English", callback_data="lang_en"),
-    )
-    keyboard.add(types.InlineKeyboardButton("🇦🇿 Azərbaycan", callback_data="lang_az"))
-
     bot.send_message(
         message.chat.id,
         get_text(message.from_user.id, "select_language"),
-        reply_markup=keyboard,
+        reply_markup=_LANG_KEYBOARD,
     )
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("lang_"))
 def handle_language_selection(call):
-    user_id = str(call.from_user.id)
+    user_id = call.from_user.id
     lang = call.data.split("_", 1)[1]
 
     user_languages[user_id] = lang
-    save_user_languages()
+    _mark_dirty("languages")
+    get_user_language.cache_clear()
 
     bot.edit_message_text(
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
-        text=get_text(call.from_user.id, "language_selected"),
+        text=get_text(user_id, "language_selected"),
     )
 
 
 # -------------------- Admin: show subscribers / requests --------------------
 
+SUBSCRIBERS_PER_MESSAGE = 20
+
 @bot.message_handler(commands=["subscribers"])
 def show_subscribers(message):
     if message.from_user.id != ADMIN_ID:
         bot.send_message(message.chat.id, get_text(message.from_user.id, "admin_only"))
         return
 
-    active = [(uid, exp) for uid, exp in subscribers.items() if float(exp) > time.time()]
+    now = time.time()
+    # snapshot: approvals and deletions change the dict from other threads
+    active = [(uid, exp) for uid, exp in list(subscribers.items()) if exp > now]
     if not active:
         bot.send_message(message.chat.id, get_text(message.from_user.id, "no_subscribers"))
         return
 
-    for uid, expires in active:
-        left_days = int((float(expires) - time.time()) / 86400)
-        text = f"👤 ID: {uid}\n📅 Days left: {left_days}"
-
+    # one message per batch keeps a long list well under Telegram's rate limit
+    for offset in range(0, len(active), SUBSCRIBERS_PER_MESSAGE):
+        batch = active[offset:offset + SUBSCRIBERS_PER_MESSAGE]
+        lines = [f"👥 Active subscribers {offset + 1}-{offset + len(batch)} of {len(active)}:\n"]
         keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(text="❌ Delete", callback_data=f"delete_{uid}"))
-        bot.send_message(message.chat.id, text, reply_markup=keyboard)
+
+        for n, (uid, expires) in enumerate(batch, start=offset + 1):
+            left_days = int((expires - now) / DAY_SECONDS)
+            lines.append(f"{n}. 👤 ID: {uid} — 📅 Days left: {left_days}")
+            keyboard.add(types.InlineKeyboardButton(text=f"❌ {uid}", callback_data=f"delete_{uid}"))
+
+        bot.send_message(message.chat.id, "\n".join(lines), reply_markup=keyboard)
+
+REQUESTS_PER_PAGE = 20
 
 @bot.message_handler(commands=["requests"])
 def show_requests(message):
@@ -596,7 +854,32 @@ def show_requests(message):
         bot.send_message(message.chat.id, "📭 No pending requests.")
         return
 
-    for uid in list(pending_requests):
+    submit_for_chat(message.chat.id, send_requests_page, message.chat.id, None)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("req_page_"))
+def handle_requests_page(call):
+    if call.from_user.id != ADMIN_ID:
+        bot.answer_callback_query(call.id, "Admin only.")
+        return
+
+    after_uid = int(call.data.split("_", 2)[2])
+    bot.answer_callback_query(call.id)
+    bot.edit_message_reply_markup(chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=None)
+    submit_for_chat(call.message.chat.id, send_requests_page, call.message.chat.id, after_uid)
+
+def send_requests_page(chat_id: int, after_uid: int | None) -> None:
+    # Pages are keyed by the last user id shown rather than an offset, so
+    # requests approved in the meantime don't make the next page skip any.
+    with _requests_lock:
+        uids = sorted(pending_requests)
+    if after_uid is not None:
+        uids = [uid for uid in uids if uid > after_uid]
+    if not uids:
+        bot.send_message(chat_id, "📭 No more pending requests.")
+        return
+
+    page = uids[:REQUESTS_PER_PAGE]
+    for uid in page:
         text = f"👤 Request from ID: {uid}"
         keyboard = types.InlineKeyboardMarkup()
         keyboard.add(
@@ -604,18 +887,25 @@ def show_requests(message):
             types.InlineKeyboardButton("❌ Reject", callback_data=f"reject_{uid}"),
         )
 
-        if uid in pending_check_photos:
+        file_id = receipt_file_ids.get(uid)
+        if file_id is not None or uid in pending_check_photos:
             try:
-                bot.send_photo(
-                    message.chat.id,
-                    photo=io.BytesIO(pending_check_photos[uid]),
-                    caption=text,
-                    reply_markup=keyboard,
-                )
+                if file_id is not None:
+                    bot.send_photo(chat_id, photo=file_id, caption=text, reply_markup=keyboard)
+                else:
+                    with open(receipt_photo_path(uid), "rb") as photo:
+                        bot.send_photo(chat_id, photo=photo, caption=text, reply_markup=keyboard)
             except Exception:
-                bot.send_message(message.chat.id, text + "\n(Receipt photo could not be sent.)", reply_markup=keyboard)
+                bot.send_message(chat_id, text + "\n(Receipt photo could not be sent.)", reply_markup=keyboard)
         else:
-            bot.send_message(message.chat.id, text, reply_markup=keyboard)
+            bot.send_message(chat_id, text, reply_markup=keyboard)
+        time.sleep(SEND_INTERVAL_SECONDS)
+
+    left = len(uids) - len(page)
+    if left:
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.add(types.InlineKeyboardButton("▶ Next", callback_data=f"req_page_{page[-1]}"))
+        bot.send_message(chat_id, f"📄 {left} more pending request(s).", reply_markup=keyboard)
 
 
 # -------------------- Start / help --------------------
@@ -623,11 +913,12 @@ def show_requests(message):
 @bot.message_handler(commands=["start"])
 def start_cmd(message):
     user_id = message.from_user.id
+    now = time.time()
 
-    if has_active_subscription(user_id):
+    if has_active_subscription(user_id, now):
         bot.send_message(user_id, get_text(user_id, "access_active"))
         return
-    if is_trial_active(user_id):
+    if is_trial_active(user_id, now):
         bot.send_message(user_id, get_text(user_id, "trial_active"))
         return
 
@@ -665,31 +956,32 @@ awaiting_payment_proof = set()  # kept for compatibility (manual checks)
 
 @bot.message_handler(commands=["subscribe"])
 def subscribe_cmd(message):
-    uid = str(message.from_user.id)
+    user_id = message.from_user.id
 
-    if is_subscribed(uid):
-        bot.send_message(message.chat.id, get_text(message.from_user.id, "subscription_active"))
+    if is_subscribed(user_id):
+        bot.send_message(message.chat.id, get_text(user_id, "subscription_active"))
         return
 
-    awaiting_payment_proof.add(int(uid))
-    bot.send_message(message.chat.id, get_text(message.from_user.id, "subscription_info"))
+    awaiting_payment_proof.add(user_id)
+    bot.send_message(message.chat.id, get_text(user_id, "subscription_info"))
 
 @bot.message_handler(commands=["trial"])
 def trial_cmd(message):
     user_id = message.from_user.id
+    now = time.time()
 
-    if has_active_subscription(user_id):
+    if has_active_subscription(user_id, now):
         bot.send_message(message.chat.id, get_text(user_id, "subscription_active"))
         return
 
-    if is_trial_active(user_id):
-        left = int(TRIAL_PERIOD_SECONDS - (time.time() - get_trial_time(user_id)))
+    if is_trial_active(user_id, now):
+        left = int(TRIAL_PERIOD_SECONDS - (now - get_trial_time(user_id)))
         bot.send_message(message.chat.id, get_text(user_id, "trial_status").format(seconds=left))
         return
 
-    if not can_start_trial(user_id):
+    if not can_start_trial(user_id, now):
         _, last_trial_time = get_trial_info(user_id)
-        cooldown_left = int((TRIAL_COOLDOWN_SECONDS - (time.time() - last_trial_time)) / 60)
+        cooldown_left = int((TRIAL_COOLDOWN_SECONDS - (now - last_trial_time)) / 60)
         bot.send_message(message.chat.id, get_text(user_id, "trial_cooldown").format(cooldown_left))
         return
 
@@ -699,31 +991,33 @@ def trial_cmd(message):
 
 @bot.message_handler(commands=["status"])
 def status_cmd(message):
-    uid = str(message.from_user.id)
+    user_id = message.from_user.id
+    now = time.time()
 
-    if is_subscribed(uid):
-        left = int((float(subscribers[uid]) - time.time()) / 86400)
+    if is_subscribed(user_id, now):
+        left = int((subscribers[user_id] - now) / DAY_SECONDS)
         bot.send_message(message.chat.id, f"<b>✅ Subscription active</b>. Remaining: {left} days.", parse_mode="HTML")
         return
 
-    if is_trial_active(int(uid)):
-        left = int(TRIAL_PERIOD_SECONDS - (time.time() - get_trial_time(int(uid))))
+    if is_trial_active(user_id, now):
+        left = int(TRIAL_PERIOD_SECONDS - (now - get_trial_time(user_id)))
         bot.send_message(message.chat.id, f"🕒 Trial period is active. Remaining: {left} sec.")
         return
 
-    bot.send_message(message.chat.id, get_text(message.from_user.id, "no_access"))
+    bot.send_message(message.chat.id, get_text(user_id, "no_access"))
 
 @bot.message_handler(commands=["profile"])
 def profile_cmd(message):
-    uid = str(message.from_user.id)
+    user_id = message.from_user.id
 
-    keys = int(image_keys.get(uid, {}).get("keys", 0))
+    keys = int(image_keys.get(user_id, {}).get("keys", 0))
 
-    if has_active_subscription(uid):
-        left_days = int((float(subscribers[uid]) - time.time()) / 86400)
-        bot.send_message(message.chat.id, get_text(message.from_user.id, "profile_active").format(days=left_days, keys=keys))
+    now = time.time()
+    if has_active_subscription(user_id, now):
+        left_days = int((subscribers[user_id] - now) / DAY_SECONDS)
+        bot.send_message(message.chat.id, get_text(user_id, "profile_active").format(days=left_days, keys=keys))
     else:
-        bot.send_message(message.chat.id, get_text(message.from_user.id, "profile_inactive").format(keys=keys))
+        bot.send_message(message.chat.id, get_text(user_id, "profile_inactive").format(keys=keys))
 
 
 # -------------------- Admin: give subscription / give trial --------------------
@@ -739,16 +1033,16 @@ def give_subscription_cmd(message):
         if len(parts) != 3:
             raise ValueError("Bad command format")
 
-        user_id = str(int(parts[1]))
+        user_id = int(parts[1])
         days = int(parts[2])
 
-        subscribers[user_id] = time.time() + days * 86400
-        save_subscribers()
+        with _subscribers_lock:
+            subscribers[user_id] = time.time() + days * DAY_SECONDS
+            _mark_dirty("subscribers")
 
-        image_keys[user_id] = {"keys": 10}
-        save_image_keys()
+        grant_image_keys(user_id)
 
-        bot.send_message(int(user_id), get_text(int(user_id), "subscription_activated").format(days=days))
+        bot.send_message(user_id, get_text(user_id, "subscription_activated").format(days=days))
         bot.send_message(message.chat.id, f"✅ Subscription added for {user_id} ({days} days).")
     except Exception:
         bot.send_message(message.chat.id, "❌ Usage: /givesub <user_id> <days>")
@@ -772,7 +1066,24 @@ def give_trial_cmd(message):
 
 # -------------------- Documents: PDF / TXT --------------------
 
+PDF_GEMINI_WORKERS = 4  # parallel Gemini requests per PDF
+
+def answer_pdf_chunk(chunk: str) -> str:
+    prompt = (
+        "Answer ALL questions in this PDF part in the same language as the PDF. "
+        "Pick one correct option per question. Be short. "
+        "At the end add: AI can make mistakes.\n\n"
+        f"{chunk}"
+    )
+    try:
+        response = safe_generate_content(prompt)
+    except Exception:
+        # one failed part must not abort the rest of the document
+        return "Gemini error"
+    return response.text.strip() if hasattr(response, "text") else "Gemini error"
+
 @bot.message_handler(content_types=["document"])
+@in_chat_queue
 def handle_document(message):
     user_id = message.from_user.id
 
@@ -786,26 +1097,27 @@ def handle_document(message):
 
         # PDF
         if message.document.mime_type == "application/pdf" or message.document.file_name.lower().endswith(".pdf"):
-            bot.send_message(user_id, get_text(user_id, "reading_pdf"))
+            # one status message, edited in place, instead of a new message per part
+            status = bot.send_message(user_id, get_text(user_id, "reading_pdf"))
             chunks = extract_text_chunks_from_pdf(downloaded)
 
             if not chunks:
-                bot.send_message(user_id, get_text(user_id, "pdf_error"))
+                bot.edit_message_text(get_text(user_id, "pdf_error"), chat_id=user_id, message_id=status.message_id)
                 return
 
-            for idx, chunk in enumerate(chunks):
-                prompt = (
-                    "Answer ALL questions in this PDF part in the same language as the PDF. "
-                    "Pick one correct option per question. Be short. "
-                    "At the end add: AI can make mistakes.\n\n"
-                    f"{chunk}"
-                )
-
-                bot.send_message(user_id, f"📤 Sending part {idx + 1} of {len(chunks)}...")
-                response = safe_generate_content(prompt)
-                answer = response.text.strip() if hasattr(response, "text") else "Gemini error"
-                for part in split_text(answer, 4000):
-                    bot.send_message(user_id, part)
+            # chunks are answered concurrently; map() still yields them in order
+            with ThreadPoolExecutor(max_workers=PDF_GEMINI_WORKERS) as pool:
+                for idx, answer in enumerate(pool.map(answer_pdf_chunk, chunks)):
+                    try:
+                        bot.edit_message_text(
+                            f"📤 Sending part {idx + 1} of {len(chunks)}...",
+                            chat_id=user_id,
+                            message_id=status.message_id,
+                        )
+                    except Exception:
+                        pass
+                    for part in split_text(answer, 4000):
+                        bot.send_message(user_id, part)
             return
 
         # TXT
@@ -832,39 +1144,56 @@ def handle_document(message):
 
 # -------------------- Photos --------------------
 
+# "task or receipt?" keyboard, built once per interface language
+@functools.lru_cache(maxsize=None)
+def image_type_keyboard(lang: str) -> types.InlineKeyboardMarkup:
+    texts = load_translations(lang)
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(
+        types.InlineKeyboardButton(texts["this_is_task"], callback_data="img_task"),
+        types.InlineKeyboardButton(texts["this_is_receipt"], callback_data="img_receipt"),
+    )
+    return keyboard
+
 @bot.message_handler(content_types=["photo"])
 def handle_photo(message):
     user_id = message.from_user.id
 
     try:
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded = bot.download_file(file_info.file_path)
+        file_id = message.photo[-1].file_id
 
         # If subscribed -> treat as task
         if has_active_subscription(user_id):
-            process_image_as_task(user_id, downloaded, message.caption)
+            submit_for_chat(message.chat.id, process_photo_task, user_id, file_id, message.caption)
             return
 
-        # Otherwise ask: task or receipt
-        pending_photos[user_id] = {"file": downloaded, "caption": message.caption}
-
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(
-            types.InlineKeyboardButton(get_text(user_id, "this_is_task"), callback_data="img_task"),
-            types.InlineKeyboardButton(get_text(user_id, "this_is_receipt"), callback_data="img_receipt"),
-        )
+        # Otherwise ask: task or receipt. Only the file_id is kept; the photo
+        # is downloaded later, and only if it turns out to be a task.
+        with _pending_photos_lock:
+            pending_photos[user_id] = {"file_id": file_id, "caption": message.caption}
 
+        keyboard = image_type_keyboard(get_user_language(user_id))
         bot.send_message(message.chat.id, get_text(user_id, "choose_image_type"), reply_markup=keyboard)
 
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Image upload error: {e}")
 
+def process_photo_task(user_id: int, file_id: str, caption: str | None):
+    try:
+        file_info = bot.get_file(file_id)
+        downloaded = bot.download_file(file_info.file_path)
+    except Exception as e:
+        bot.send_message(user_id, f"❌ Image upload error: {e}")
+        return
+    process_image_as_task(user_id, downloaded, caption)
+
 @bot.callback_query_handler(func=lambda call: call.data in ["img_task", "img_receipt"])
 def handle_image_decision(call):
     user_id = call.from_user.id
 
-    photo_data = pending_photos.pop(user_id, None)
-    if not photo_data or "file" not in photo_data:
+    with _pending_photos_lock:
+        photo_data = pending_photos.pop(user_id, None)
+    if not photo_data or "file_id" not in photo_data:
         bot.send_message(user_id, get_text(user_id, "photo_not_found"))
         return
 
@@ -873,20 +1202,21 @@ def handle_image_decision(call):
             bot.send_message(user_id, get_text(user_id, "no_access"))
             return
 
-        process_image_as_task(user_id, photo_data["file"], photo_data.get("caption"))
+        submit_for_chat(user_id, process_photo_task, user_id, photo_data["file_id"], photo_data.get("caption"))
         return
 
     # img_receipt
-    if str(user_id) in pending_requests:
+    with _requests_lock:
+        already_sent = user_id in pending_requests
+        if not already_sent:
+            save_receipt_photo(user_id, photo_data["file_id"])
+            pending_requests.add(user_id)
+            _mark_dirty("requests")
+
+    if already_sent:
         bot.send_message(user_id, get_text(user_id, "receipt_already_sent"))
         return
 
-    pending_check_photos[str(user_id)] = photo_data["file"]
-    save_pending_check_photos()
-
-    pending_requests.add(str(user_id))
-    save_pending_requests()
-
     caption = f"👤 New receipt from user ID: {user_id}"
     keyboard = types.InlineKeyboardMarkup()
     keyboard.add(
@@ -895,7 +1225,7 @@ def handle_image_decision(call):
     )
 
     try:
-        bot.send_photo(ADMIN_ID, photo=BytesIO(photo_data["file"]), caption=caption, reply_markup=keyboard)
+        bot.send_photo(ADMIN_ID, photo=photo_data["file_id"], caption=caption, reply_markup=keyboard)
     except Exception:
         bot.send_message(ADMIN_ID, f"⚠ Could not send receipt photo from user {user_id}")
 
@@ -904,27 +1234,103 @@ def handle_image_decision(call):
 
 # -------------------- Links parsing --------------------
 
+MAX_PAGE_BYTES = 2_000_000   # linked pages are cut off after this many bytes
+MAX_PDF_BYTES = 20_000_000   # a truncated PDF is unreadable, so larger linked PDFs are rejected
+MAX_TEXT_CHARS = 200_000     # plain-text / JSON links are cut off after this many characters
+
+LINK_CACHE_CHARS = 16_000_000  # total characters of cached page text, across all links
+
+# the same test link is often sent by many users; keep its text for a while.
+# The cache is sized by text length, not entry count, since one page can be MBs.
+_link_cache = TTLCache(maxsize=LINK_CACHE_CHARS, ttl=600, getsizeof=len)
+_link_cache_lock = Lock()
+
 def get_full_visible_text(url: str) -> str:
+    key = url.split("#", 1)[0]  # the fragment never reaches the server
+    with _link_cache_lock:
+        text = _link_cache.get(key)
+    if text is None:
+        text = fetch_visible_text(key)
+        with _link_cache_lock:
+            try:
+                _link_cache[key] = text
+            except ValueError:  # larger than the whole cache; just don't keep it
+                pass
+    return text
+
+def fetch_visible_text(url: str) -> str:
     headers = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
             "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
         )
     }
-    response = requests.get(url, headers=headers, timeout=15)
-    response.raise_for_status()
-
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    for tag in soup(["script", "style"]):
-        tag.extract()
-
-    for hidden in soup.select('[style*="display:none"], [style*="visibility:hidden"]'):
-        hidden.extract()
+    # stream the body and stop at the size cap so a huge page can't exhaust memory;
+    # pages are cut off there, PDFs over their cap are refused
+    with http_session.get(url, headers=headers, timeout=15, stream=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "").lower()
+        is_pdf = "pdf" in content_type
+        body = bytearray()
+        for block in response.iter_content(65536):
+            body += block
+            if is_pdf:
+                if len(body) > MAX_PDF_BYTES:
+                    raise ValueError("PDF too large")
+            elif len(body) >= MAX_PAGE_BYTES:
+                del body[MAX_PAGE_BYTES:]
+                break
+        encoding = response.encoding if "charset" in content_type else "utf-8"
+
+    # only HTML goes through the parser; PDFs reuse the document path
+    if is_pdf:
+        chunks = extract_text_chunks_from_pdf(bytes(body))
+        if not chunks:
+            raise ValueError("no readable text in the PDF")
+        return "\n\n".join(chunks)
+    if "html" in content_type or not content_type:
+        # a charset from the HTTP header wins; without one the parser sniffs <meta charset>
+        html = bytes(body)
+        if "charset" in content_type:
+            try:
+                html = body.decode(encoding, errors="replace")
+            except LookupError:  # unknown charset name
+                pass
+        text = html_to_visible_text(html)
+    elif content_type.startswith("text/") or "json" in content_type:
+        text = body.decode(encoding, errors="replace")[:MAX_TEXT_CHARS]
+    else:
+        raise ValueError(f"unsupported content type: {content_type.split(';', 1)[0]}")
+
+    # one regex pass strips every line and drops the empty ones
+    return _LINE_BREAK_RE.sub("\n", text).strip()
+
+_HIDDEN_SELECTOR = '[style*="display:none"], [style*="visibility:hidden"]'
+# the same filter for the lxml fallback, compiled once
+_HIDDEN_XPATH = None if LexborHTMLParser is not None else etree.XPath(
+    '//*[contains(@style, "display:none") or contains(@style, "visibility:hidden")]'
+)
+
+def html_to_visible_text(html: bytes | str) -> str:
+    # selectolax (Lexbor) parses and queries in C; lxml is the fallback
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(["script", "style"])
+        for hidden in tree.css(_HIDDEN_SELECTOR):
+            hidden.decompose()
+        root = tree.body or tree.root
+        return root.text(separator="\n") if root is not None else ""
 
-    text = soup.get_text(separator="\n")
-    lines = [line.strip() for line in text.splitlines()]
-    return "\n".join(line for line in lines if line)
+    try:
+        root = lxml_html.document_fromstring(html)
+    except etree.ParserError:  # empty document
+        return ""
+    etree.strip_elements(root, etree.Comment, "script", "style", with_tail=False)
+    for hidden in _HIDDEN_XPATH(root):
+        if hidden.getparent() is not None:
+            hidden.drop_tree()  # keeps the text that follows the element
+    body = root.find("body")
+    return "\n".join((body if body is not None else root).itertext())
 
 def process_link(url: str) -> str:
     try:
@@ -948,29 +1354,45 @@ def delete_subscriber(call):
         bot.answer_callback_query(call.id, "Admin only.")
         return
 
-    uid = call.data.split("_", 1)[1]
+    uid = int(call.data.split("_", 1)[1])
 
-    if uid in subscribers:
-        del subscribers[uid]
-        save_subscribers()
+    with _subscribers_lock:
+        removed = subscribers.pop(uid, None) is not None
+        if removed:
+            _mark_dirty("subscribers")
 
+    if removed:
         try:
-            bot.send_message(int(uid), get_text(int(uid), "deletion"))
+            bot.send_message(uid, get_text(uid, "deletion"))
         except Exception:
             pass
 
+        # the list message covers many subscribers: only drop the pressed
+        # button (keeping the layout) and mark its line as removed
+        rows = [
+            [button for button in row if button.callback_data != call.data]
+            for row in call.message.reply_markup.keyboard
+        ]
+        keyboard = types.InlineKeyboardMarkup(keyboard=[row for row in rows if row])
+        marker = f"👤 ID: {uid} — "
+        text = "\n".join(
+            line.split(" — ", 1)[0] + " — ❌ Removed" if marker in line else line
+            for line in call.message.text.split("\n")
+        )
         bot.edit_message_text(
+            text,
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
-            text=f"✅ Subscriber {uid} removed.",
+            reply_markup=keyboard,
         )
+        bot.answer_callback_query(call.id, f"✅ Subscriber {uid} removed.")
     else:
         bot.answer_callback_query(call.id, "Already removed.")
 
-def process_rejection_reason(message, uid: str, original_message):
+def process_rejection_reason(message, uid: int, original_message):
     reason = message.text.strip()
     try:
-        bot.send_message(int(uid), f"❌ Your request has been rejected.\nReason: {reason}")
+        bot.send_message(uid, f"❌ Your request has been rejected.\nReason: {reason}")
         bot.edit_message_caption(
             chat_id=original_message.chat.id,
             message_id=original_message.message_id,
@@ -980,8 +1402,10 @@ def process_rejection_reason(message, uid: str, original_message):
     except Exception:
         pass
     finally:
-        pending_requests.discard(uid)
-        save_pending_requests()
+        with _requests_lock:
+            pending_requests.discard(uid)
+            _mark_dirty("requests")
+            remove_receipt_photo(uid)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("approve_") or call.data.startswith("reject_"))
 def handle_request_decision(call):
@@ -990,29 +1414,34 @@ def handle_request_decision(call):
         return
 
     action, uid = call.data.split("_", 1)
-    uid = str(uid)
+    uid = int(uid)
+
+    with _requests_lock:
+        pending = uid in pending_requests
+        # claim the request before replying, so a double click can't approve twice
+        if pending and action == "approve":
+            pending_requests.remove(uid)
+            _mark_dirty("requests")
+            remove_receipt_photo(uid)
 
-    if uid not in pending_requests:
+    if not pending:
         bot.answer_callback_query(call.id, "Already processed.")
         return
 
     if action == "approve":
-        subscribers[uid] = time.time() + SUBSCRIPTION_DAYS * 86400
-        save_subscribers()
+        with _subscribers_lock:
+            subscribers[uid] = time.time() + SUBSCRIPTION_SECONDS
+            _mark_dirty("subscribers")
 
-        image_keys[uid] = {"keys": 10}
-        save_image_keys()
+        grant_image_keys(uid)
 
-        bot.send_message(int(uid), f"✅ Approved! Subscription is active for {SUBSCRIPTION_DAYS} days.")
+        bot.send_message(uid, f"✅ Approved! Subscription is active for {SUBSCRIPTION_DAYS} days.")
         new_caption = f"✅ Request from user ID: {uid} approved."
     else:
         msg = bot.send_message(call.message.chat.id, "📝 Write rejection reason:")
         bot.register_next_step_handler(msg, lambda msg2: process_rejection_reason(msg2, uid, call.message))
         return
 
-    pending_requests.remove(uid)
-    save_pending_requests()
-
     try:
         bot.edit_message_caption(
             chat_id=call.message.chat.id,
@@ -1026,7 +1455,10 @@ def handle_request_decision(call):
 
 # -------------------- Announcements (admin) --------------------
 
-announcement_mode = {}
+ANNOUNCE_WORKERS = 30  # concurrent sends during an announcement
+
+announcement_mode = {}  # ADMIN_ID -> {"stage": "compose" | "preview", "text": str, "preview": int}
+_preview_ids = itertools.count(1)  # ties a preview's buttons to the text it showed
 
 @bot.message_handler(commands=["announce"])
 def announce_cmd(message):
@@ -1034,12 +1466,13 @@ def announce_cmd(message):
         bot.send_message(message.chat.id, get_text(message.from_user.id, "admin_only"))
         return
 
-    active_subscribers = sum(1 for _, exp in subscribers.items() if float(exp) > time.time())
+    now = time.time()
+    active_subscribers = sum(1 for exp in list(subscribers.values()) if exp > now)
     if active_subscribers == 0:
         bot.send_message(message.chat.id, "📭 No active subscribers.")
         return
 
-    announcement_mode[ADMIN_ID] = True
+    announcement_mode[ADMIN_ID] = {"stage": "compose"}
     bot.send_message(
         message.chat.id,
         f"📢 Announcement mode enabled!\n"
@@ -1056,11 +1489,14 @@ def cancel_announce_cmd(message):
 @bot.message_handler(func=lambda m: m.from_user.id == ADMIN_ID and ADMIN_ID in announcement_mode and not m.text.startswith("/"))
 def handle_announcement_text(message):
     announcement_text = message.text
+    # keep the raw text: the send step reads it back instead of parsing the preview
+    preview_id = next(_preview_ids)
+    announcement_mode[ADMIN_ID] = {"stage": "preview", "text": announcement_text, "preview": preview_id}
 
     keyboard = types.InlineKeyboardMarkup()
     keyboard.add(
-        types.InlineKeyboardButton("✅ Send", callback_data="send_announcement"),
-        types.InlineKeyboardButton("❌ Cancel", callback_data="cancel_announcement"),
+        types.InlineKeyboardButton("✅ Send", callback_data=f"send_announcement_{preview_id}"),
+        types.InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_announcement_{preview_id}"),
     )
 
     bot.send_message(
@@ -1069,25 +1505,30 @@ def handle_announcement_text(message):
         reply_markup=keyboard,
     )
 
-@bot.callback_query_handler(func=lambda call: call.data in ["send_announcement", "cancel_announcement"])
+@bot.callback_query_handler(func=lambda call: call.data.startswith(("send_announcement_", "cancel_announcement_")))
 def handle_announcement_decision(call):
     if call.from_user.id != ADMIN_ID:
         bot.answer_callback_query(call.id, "Admin only.")
         return
 
-    if call.data == "cancel_announcement":
+    action, preview_id = call.data.rsplit("_", 1)
+    state = announcement_mode.get(ADMIN_ID, {})
+    # buttons of an older preview must not act on text they never showed
+    if state.get("preview") != int(preview_id):
+        bot.answer_callback_query(call.id, "This preview is outdated.")
+        bot.edit_message_reply_markup(chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=None)
+        return
+
+    if action == "cancel_announcement":
         announcement_mode.pop(ADMIN_ID, None)
         bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id, text="❌ Cancelled.")
         return
 
     # send_announcement
-    try:
-        announcement_text = call.message.text.split("📝 Preview:\n\n", 1)[1].rsplit("\n\nSend to all active subscribers?", 1)[0]
-    except Exception:
-        announcement_text = ""
-
-    sent_count = 0
-    failed_count = 0
+    announcement_text = state.get("text")
+    if not announcement_text:
+        bot.answer_callback_query(call.id, "Nothing to send.")
+        return
 
     bot.edit_message_text(
         chat_id=call.message.chat.id,
@@ -1095,18 +1536,27 @@ def handle_announcement_decision(call):
         text="📤 Sending...",
     )
 
-    for uid, exp in list(subscribers.items()):
-        if float(exp) > time.time():
-            try:
-                bot.send_message(int(uid), f"📢\n\n{announcement_text}", parse_mode="HTML")
-                sent_count += 1
-                time.sleep(0.1)
-            except Exception:
-                failed_count += 1
+    announcement_mode.pop(ADMIN_ID, None)
+
+    now = time.time()
+    active = [uid for uid, exp in list(subscribers.items()) if exp > now]
+    submit_for_chat(call.message.chat.id, send_announcement, active, announcement_text, call.message)
+
+def send_announcement(user_ids: list, announcement_text: str, status_message) -> None:
+    # Sends overlap on a pool while submissions are paced at Telegram's
+    # ~30 msg/s limit, instead of one blocking send plus a sleep per user.
+    with ThreadPoolExecutor(max_workers=ANNOUNCE_WORKERS) as pool:
+        futures = []
+        for uid in user_ids:
+            futures.append(pool.submit(bot.send_message, uid, f"📢\n\n{announcement_text}", parse_mode="HTML"))
+            time.sleep(SEND_INTERVAL_SECONDS)
+
+    sent_count = sum(1 for future in futures if future.exception() is None)
+    failed_count = len(futures) - sent_count
 
     bot.edit_message_text(
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
+        chat_id=status_message.chat.id,
+        message_id=status_message.message_id,
         text=(
             "✅ Done.\n\n"
             f"Sent: {sent_count}\n"
@@ -1114,45 +1564,42 @@ def handle_announcement_decision(call):
         ),
     )
 
-    announcement_mode.pop(ADMIN_ID, None)
-
 
 # -------------------- Main text handler --------------------
 
 @bot.message_handler(content_types=["text"])
+@in_chat_queue
 def handle_text(message):
-    text_lower = (message.text or "").lower()
+    text = message.text or ""
+    now = time.time()
 
     # trial: only one image generation
-    if is_trial_active(message.from_user.id):
+    if is_trial_active(message.from_user.id, now):
         rec = _get_trial_record(message.from_user.id)
         if rec and int(rec.get("used_image", 0)) == 1:
-            if any(p in text_lower for p in ["сгенерируй", "generate", "draw", "нарисуй"]):
+            if _TRIAL_IMAGE_RE.search(text):
                 bot.send_message(message.chat.id, get_text(message.from_user.id, "only1"))
                 return
 
     # image generation
-    if any(p in text_lower for p in ["сгенерируй", "generate image", "generate", "нарисуй", "создай изображение", "создай фото", "создай картинку", "draw"]):
-        uid = str(message.from_user.id)
+    if _IMAGE_RE.search(text):
+        uid = message.from_user.id
 
-        if not (has_active_subscription(uid) or is_trial_active(message.from_user.id)):
+        if not (has_active_subscription(uid, now) or is_trial_active(message.from_user.id, now)):
             bot.send_message(message.chat.id, get_text(message.from_user.id, "no_access"))
             return
 
-        if uid not in image_keys or int(image_keys[uid].get("keys", 0)) <= 0:
+        if not take_image_key(uid):
             bot.send_message(message.chat.id, get_text(message.from_user.id, "no_keys"))
             return
 
-        image_keys[uid]["keys"] = int(image_keys[uid].get("keys", 0)) - 1
-        save_image_keys()
-
         bot.send_message(message.chat.id, get_text(message.from_user.id, "generating_image"))
 
         url = generate_image_from_prompt(message.text)
         if url:
             try:
                 bot.send_photo(message.chat.id, photo=url)
-                if is_trial_active(message.from_user.id):
+                if is_trial_active(message.from_user.id, now):
                     _set_trial_used_image(message.from_user.id, 1)
             except Exception:
                 bot.send_message(message.chat.id, f"🖼 Image link:\n{url}")
@@ -1161,28 +1608,27 @@ def handle_text(message):
         return
 
     # ignore commands
-    if (message.text or "").startswith("/"):
+    if text.startswith("/"):
         return
 
     user_id = message.from_user.id
-    if not (has_active_subscription(user_id) or is_trial_active(user_id)):
+    if not (has_active_subscription(user_id, now) or is_trial_active(user_id, now)):
         bot.send_message(message.chat.id, get_text(message.from_user.id, "no_access"))
         return
 
     # link
-    m = re.search(r"https?://\S+", message.text or "")
-    if m:
-        url = m.group()
+    url = find_url(text)
+    if url:
         bot.send_message(message.chat.id, get_text(message.from_user.id, "analyzing_link"))
         result = process_link(url)
         for chunk in split_text(result, 4096):
             bot.send_message(message.chat.id, chunk)
         return
 
-    if len(message.text or "") > 10000:
+    if len(text) > 10000:
         bot.send_message(message.chat.id, get_text(message.from_user.id, "processing"))
 
-    prompt = "Answer in the same language as the user's message.\n\n" + (message.text or "")
+    prompt = "Answer in the same language as the user's message.\n\n" + text
     response = safe_generate_content(prompt)
     result = response.text.strip() if hasattr(response, "text") else "Gemini error"
 
@@ -1192,13 +1638,14 @@ def handle_text(message):
 
 # -------------------- Runner --------------------
 
+LONG_POLL_SECONDS = 50  # Telegram holds getUpdates open up to this long when idle
+
 def start_bot():
     bot.remove_webhook()
-    while True:
-        try:
-            bot.polling(non_stop=True)
-        except Exception:
-            time.sleep(5)
+    # infinity_polling restarts polling on errors by itself
+    bot.infinity_polling(timeout=LONG_POLL_SECONDS, long_polling_timeout=LONG_POLL_SECONDS)
+
+Thread(target=_flush_loop, daemon=True).start()
 
 time.sleep(1)
 start_bot()